@@ -21,25 +21,78 @@ import json
 import glob
 import os
 
-from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+try:
+    import orjson       # Optional C serializer, several times faster.  The standard json module is used without it
+except ImportError:
+    orjson = None
 from tikz_tokens_2_json import *
 from gen_tikz_tokens import *
 
-def initialize_output(filename: str) -> None:
+def write_json(filename: str, data: dict) -> None:
     """
-    Check whether the output file exists, delete it and verify deletion.
+    Write data as indented (2 space) UTF-8 JSON, with orjson when it is installed.
+    An existing file is truncated by the open, so there is no need to delete it first.
     Exit the script if there are permission problems.
     """
-    if os.path.exists(filename):
-        try:
-            os.remove(filename)
-        except Exception as e:
-            raise SystemExit(f"❌ Error: Unable to delete old file '{filename}'. Check permissions. ({e})")
-        if os.path.exists(filename):
-            raise SystemExit(f"❌ Error: The file '{filename}' was not deleted correctly.")
+    try:
+        if orjson is not None:
+            with open(filename, 'wb') as fh:
+                fh.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        else:
+            with open(filename, 'w', encoding='utf-8') as fh:      # Stream to the file, no intermediate JSON string
+                json.dump(data, fh, indent=2, ensure_ascii=False)
+    except OSError as e:
+        raise SystemExit(f"❌ Error: Unable to write '{filename}'. Check permissions. ({e})")
+
+def process_one(input_filename: str) -> None:
+    """
+    Convert one .tex file to its .json.  Files are independent, so main() may run this in parallel worker processes.
+    """
+    output_filename = input_filename.replace("input-", "output-").replace(".tex", ".json")
+    print(f"🔄 Processing: {input_filename} → {output_filename}")
+
+    json_objects = []
+    current_position = {"x": 0, "y": 0}
+
+    if not os.path.exists(input_filename):
+        print(f"⚠️  Error: File '{input_filename}' not found, skipping.")
+        return
+
+    with open(input_filename, encoding="utf-8") as f:
+        circuit_content = extract_circuitikz_content(f)     # Reads only up to the closing \end{...}
+
+    if not circuit_content:
+        error_data = {"error": "No valid \\begin{circuitikz} block found."}
+        write_json(output_filename, error_data)
+        print(f"❌ Error: No CircuiTikZ block found. Saved details to '{output_filename}'.")
+        return
+
+    # Get \coordinates mapping -- this works, but coordinate mapping is not yet supported later.
+    coord_map = parse_coordinate_definitions(circuit_content)
+
+    # Tokenize reach \draw \node line --> list of lists containing , separated tokens for each.
+    token_blocks = tokenize_all_draw_contents(circuit_content)
+
+    # Create a JSON Object for each \draw \ node token blocks
+    if token_blocks:
+        for tokens in token_blocks:
+            #  No named coords for CircuiTikZ Designer so will not process them
+            # processed = replace_named_coords(block, coord_map)   #<-- That function probably needs to be rewritten
+            next_jason_object = convert_tokens_to_json(tokens)
+            json_objects.append(next_jason_object)
+
+    data = {"version": "0.1",
+            "components": json_objects
+            }
+    write_json(output_filename, data)
+    print(f"✅ Successfully saved to '{output_filename}'.")
 
 def main():
-    input_files = glob.glob("*.tex")                   # All files with .tex in a directory
+    # All files with .tex in a directory (like glob "*.tex", hidden files are skipped). scandir's DirEntry caches the
+    # file type, so there is no per-file stat or fnmatch
+    input_files = [e.name for e in os.scandir('.')
+                   if e.name.endswith('.tex') and not e.name.startswith('.') and e.is_file()]
     # input_files = glob.glob("a_specific_file.tex")    # Single file name
     # input_files = glob.glob("input-*.tex")            # All files with input-*.tex in a directory
 
@@ -56,48 +109,13 @@ def main():
         print(f"  - {f}")
     print()
 
-    for input_filename in input_files:
-        output_filename = input_filename.replace("input-", "output-").replace(".tex", ".json")
-        print(f"🔄 Processing: {input_filename} → {output_filename}")
-
-        json_objects = []
-        current_position = {"x": 0, "y": 0}
-        initialize_output(output_filename)
-
-        if not os.path.exists(input_filename):
-            print(f"⚠️  Error: File '{input_filename}' not found, skipping.")
-            continue
-
-        with open(input_filename, encoding="utf-8") as f:
-            latex_code = f.read()
-
-        circuit_content = extract_circuitikz_content(latex_code)
-        if not circuit_content:
-            error_data = {"error": "No valid \\begin{circuitikz} block found."}
-            Path(output_filename).write_text(json.dumps(error_data, indent=2), encoding='utf-8')
-            print(f"❌ Error: No CircuiTikZ block found. Saved details to '{output_filename}'.")
-            continue
-
-        # Get \coordinates mapping -- this works, but coordinate mapping is not yet supported later.
-        coord_map = parse_coordinate_definitions(circuit_content)
-
-        # Tokenize reach \draw \node line --> list of lists containing , separated tokens for each.
-        token_blocks = tokenize_all_draw_contents(circuit_content)
-
-        # Create a JSON Object for each \draw \ node token blocks
-        if token_blocks:
-            for tokens in token_blocks:
-                #  No named coords for CircuiTikZ Designer so will not process them
-                # processed = replace_named_coords(block, coord_map)   #<-- That function probably needs to be rewritten
-                next_jason_object = convert_tokens_to_json(tokens)
-                json_objects.append(next_jason_object)
-
-        data = {"version": "0.1",
-                "components": json_objects
-                }
-        json_output = json.dumps(data, indent=2, ensure_ascii=False)
-        Path(output_filename).write_text(json_output, encoding='utf-8')
-        print(f"✅ Successfully saved to '{output_filename}'.")
+    if len(input_files) == 1:
+        process_one(input_files[0])
+    else:
+        # Parsing is CPU bound (regex) so use processes, not threads.  The order of the progress messages may interleave.
+        # No more workers than files, the pool may start all of them up front
+        with ProcessPoolExecutor(max_workers=min(len(input_files), os.cpu_count() or 1)) as executor:
+            list(executor.map(process_one, input_files))
 
     print("\n🎉 All files processed!\n")
 
@@ -4,28 +4,195 @@
 Conversion of PHP circuit parsing utilities into Python.
 """
 
+import functools
 import re
 
+_ENVIRONMENTS = ('circuitikz', 'tikzpicture')       # \begin{...} blocks that hold the circuit
 
-def extract_circuitikz_content(latex_code: str) -> str | None:
+# ---------------------------------------------------------------------
+# Pre-compiled regular expressions (compiled once at import, not per line)
+# ---------------------------------------------------------------------
+
+_RE_COORD = re.compile(r'\\coordinate\s*\((.*?)\)\s*at\s*\((.*?)\);', re.DOTALL)
+
+_RE_SHAPE = re.compile(r'\\node\s*\[\s*shape\s*=')     # Check if form is \node[shape = ...
+
+# Every command of interest in one alternation: group 1 is 'draw' or 'path' (then 2: [options], 3: body up to the ;)
+# or None for the start of a \node[ command
+_RE_COMMAND = re.compile(r'\\(draw|path)(\[.*?\])?(.*?);|\\node\[', re.DOTALL)
+_RE_ARROW = re.compile(r'\[.*?(<-|->|<->).*?\]')
+# Tokens of a \draw/\path body: (coord), [options] / to[...] / node[...] nested up to three brackets deep, --, -|, |-
+# The bracket alternative is written "unrolled" ([^[\]]* runs between nested groups) so there is only one way to match
+# any input, i.e., no backtracking across the per-character alternation on long option strings.
+_RE_WIRE_TURN = re.compile(r"\([^()]*\)|(?:to|node)?\[[^[\]]*(?:\[[^[\]]*(?:\[[^[\]]*\][^[\]]*)*\][^[\]]*)*\]|--|\-\||\|-")
+
+
+def _find_environment_begin(text: str, start: int = 0) -> tuple[int, str | None]:
+    """
+    Locate the earliest \\begin{circuitikz} or \\begin{tikzpicture} in text at or after start.
+    Returns (index of the \\begin, environment name) or (-1, None)
+    """
+    best, best_env = -1, None
+    for env in _ENVIRONMENTS:
+        i = text.find('\\begin{' + env + '}', start)
+        if i >= 0 and (best < 0 or i < best):
+            best, best_env = i, env
+    return best, best_env
+
+
+def extract_circuitikz_content(source) -> str | None:
     """
     Extracts the entire content of the block \\begin{circuitikz} or \\begin{tikzpicture} to \\end.
+
+    source is either the LaTeX code as a string, or an open text file.  A file is read line-by-line and only up to the
+    closing \\end{...}, so the document never has to be held in memory in full.  In both cases a \\begin that is never
+    closed (e.g. one mentioned in a comment) is skipped and a later block is used.
     """
-    match = re.search(r'\\begin\{(circuitikz|tikzpicture)\}(.*?)\\end\{\1\}', latex_code, re.DOTALL)
-    return match.group(2) if match else None
+    if isinstance(source, str):
+        pos = 0
+        while True:
+            begin, env = _find_environment_begin(source, pos)
+            if env is None:
+                return None
+            start = begin + len(env) + 8      # len('\\begin{}') == 8
+            end = source.find('\\end{' + env + '}', start)
+            if end >= 0:
+                return source[start:end]
+            pos = begin + 1     # Unterminated block, keep looking for a later one
+
+    buf = []
+    end_tag = None
+    for line in source:
+        if end_tag is None:
+            begin, env = _find_environment_begin(line)
+            if env is None:
+                continue
+            end_tag = '\\end{' + env + '}'
+            line = line[begin + len(env) + 8:]
+        end = line.find(end_tag)
+        if end >= 0:
+            buf.append(line[:end])
+            return ''.join(buf)
+        buf.append(line)
+
+    if end_tag is None:
+        return None
+    # End of file with the block still open: skip that \begin and search the text read after it, as for a string
+    return extract_circuitikz_content(''.join(buf))
 
 
 def parse_coordinate_definitions(content: str) -> dict[str, str]:
     """
     Analyzes the text and creates a map of all coordinates defined with \\coordinate.
     """
-    coord_map = {}
-    pattern = r'\\coordinate\s*\((.*?)\)\s*at\s*\((.*?)\);'
-    for name, value in re.findall(pattern, content, re.DOTALL):
-        coord_map[name.strip()] = f"({value.strip()})"
-    return coord_map
+    return {name.strip(): f"({value.strip()})" for name, value in _RE_COORD.findall(content)}
+
+
+def _is_shape_node(line: str) -> bool:
+    """
+    True if the line is of the form \\node[shape=...  The literal prefix check covers CircuiTikZ Designer output, the
+    regex is only needed when 'shape' is present but with extra whitespace (e.g. \\node [ shape = ...)
+    """
+    if 'shape' not in line:
+        return False
+    if line.lstrip().startswith('\\node[shape='):
+        return True
+    return _RE_SHAPE.search(line) is not None
 
-def three_node_parser(tex_str):
+
+# ---------------------------------------------------------------------
+# Node scanner:  node[options](name) at (coord){label}
+# Plain str.find over the few delimiters of a node, in place of backtracking regular expressions
+# ---------------------------------------------------------------------
+
+def _skip_space(s, i):
+    """
+    :return: Index of the first non whitespace character of s at or after i (len(s) if none)
+    """
+    while s[i:i + 1].isspace():      # ''.isspace() is False at the end of s
+        i += 1
+    return i
+
+
+def _find_closing(s, i, follow):
+    """
+    Find the first } at or after i that is followed (after optional whitespace) by follow, e.g. 'node[' or ';'.
+    Braces inside the label, like {\\Large A} or {rgb,255:...}, are skipped over since they are not followed by follow.
+    :return: Index of the }, or -1
+    """
+    while True:
+        i = s.find('}', i)
+        if i < 0 or s.startswith(follow, _skip_space(s, i + 1)):
+            return i
+        i += 1
+
+
+def _scan_at_label(s, i, last):
+    """
+    Scan 'at (coord){label}' starting at index i.  A node that is followed by another node may have other text before
+    the 'at' (but not a ';' ending the node list), the last node of a command only whitespace.
+    :return: (coord, label, end) with end the index after the closing }, or None
+    """
+    if last:
+        a = _skip_space(s, i)
+        if not s.startswith('at', a):
+            return None
+    else:
+        a = s.find('at', i)
+
+    semi = i
+    while a >= 0:
+        if not last:        # The text skipped to reach this 'at' may not hold a ; followed by node[
+            semi = s.find(';', semi, a)
+            while semi >= 0:
+                if s.startswith('node[', _skip_space(s, semi + 1)):
+                    return None
+                semi = s.find(';', semi + 1, a)
+            semi = a
+
+        j = _skip_space(s, a + 2)
+        if s.startswith('(', j):
+            k = s.find(')', j)
+            if k >= 0:
+                b = _skip_space(s, k + 1)
+                if s.startswith('{', b):
+                    e = _find_closing(s, b + 1, ';' if last else 'node[')
+                    if e >= 0:
+                        return s[j:k + 1], s[b + 1:e], e + 1
+        if last:
+            return None
+        a = s.find('at', a + 1)
+    return None
+
+
+def _scan_node(s, prefix='node[', last=False):
+    """
+    Find the first node of s, i.e., prefix + 'options](name) at (coord){label}'.  Only [options] and (coord) are
+    required.  With last=True the node must end the command with a ;, otherwise it must be followed by another node[.
+    :return: (options, name, coord, label, rest) with name None when absent and rest the text after the closing }
+             (the following nodes), or None
+    """
+    p = s.find(prefix)
+    while p >= 0:
+        i = p + len(prefix)
+        close = s.find(']', i)
+        if close > i:       # At least one option character
+            after = close + 1
+            names = [(None, after)]
+            if s.startswith('(', after):
+                end_name = s.find(')', after)
+                if end_name >= 0:
+                    names.insert(0, (s[after + 1:end_name], end_name + 1))
+            for name, j in names:
+                found = _scan_at_label(s, j, last)
+                if found:
+                    coord, label, end = found
+                    return s[i:close], name, coord, label, s[end:]
+        p = s.find(prefix, p + 1)
+    return None
+
+
+def three_node_parser(tex_str, m1=None):
     """
     Nodes are as follows:   "[options], (name), at (coord), {text}" where only the [options]  and (coord) are really required
     This could be done recursively, but so far only have three levels deep with 1st, & last node patterns differnt
@@ -37,44 +204,30 @@ def three_node_parser(tex_str):
                                               node[anchor=north, align=center, text width=0.991cm, inner sep=5pt] at (6.672, 13.312){\\Large A $e_t$};'
     :return node_content:   Parsed tokens of form [0: '3node', 1: '[shape]', 2: name, 3: coord1, 4: label1, 5: [id_anchor]', 6: id_name, 7: id_loc,
                                                    8: id_label, 9: [text options / positioning], 10: text_name, 11: text_loc, 12: [text str]
+    :param m1:        Optional _scan_node result for the first node of tex_str when the caller already has it
     """
 
-    pattern_1st_node = r'\\node\[([^\]]+)\](?:\(([^)]*)\))?(?:(?:(?!;\s*node\[).)*?)at\s*(\([^)]*\))\s*\{((?:(?!\}\s*node\[).)*)\}(\s*node\[.*)'
-    pattern_2nd_node = r'node\[([^\]]+)\](?:\(([^)]*)\))?(?:(?:(?!;\s*node\[).)*?)at\s*(\([^)]*\))\s*\{((?:(?!\}\s*node\[).)*)\}(\s*node\[.*)'
-    pattern_last_node = r'node\[([^\]]+)\](?:\(([^)]*)\))?\s*at\s*(\([^)]*\))\s*\{((?:(?!\}\s*;).)*)\}\s*;'
     node_content = None
-    m1 = re.search(pattern_1st_node, tex_str, re.VERBOSE | re.DOTALL)
+    if m1 is None:
+        m1 = _scan_node(tex_str, '\\node[')
     if m1:
-        shape = m1.group(1).strip()
-        name = m1.group(2).strip()
-        coord1 = m1.group(3).strip()
-        label1 = (m1.group(4) or '').strip()
-        node_content = ['3node', '[' + shape + ']', name, coord1, label1]
+        shape, name, coord1, label1, rest = m1
+        node_content = ('3node', '[' + shape.strip() + ']', (name or '').strip(), coord1.strip(), label1.strip())
 
-        m2 = re.search(pattern_2nd_node, m1.group(5), re.VERBOSE | re.DOTALL)
+        m2 = _scan_node(rest)
         if m2:
-            id_anchor = (m2.group(1) or '').strip()
-            id_label = (m2.group(2) or '').strip()
-            id_loc = (m2.group(3) or '').strip()
-            id_text = (m2.group(4) or '').strip()
-
+            id_anchor, id_label, id_loc, id_text, rest = m2
+            node_content += ('[' + id_anchor.strip() + ']', (id_label or '').strip(), id_loc.strip(), id_text.strip())
 
-            node_content += ['[' + id_anchor + ']', id_label, id_loc,  id_text]
-
-        m3 = re.search(pattern_last_node, m2.group(5), re.VERBOSE | re.DOTALL)
+        m3 = _scan_node(rest, last=True)
         if m3:
-            label_anchor = (m3.group(1) or '').strip()
-            label_label = (m3.group(2) or '').strip()
-            label_loc = (m3.group(3) or '').strip()
-            label_text = (m3.group(4) or '').strip()
-
-
-            node_content += ['[' + label_anchor + ']', label_label, label_loc, label_text]
+            label_anchor, label_label, label_loc, label_text, _ = m3
+            node_content += ('[' + label_anchor.strip() + ']', (label_label or '').strip(), label_loc.strip(), label_text.strip())
 
     return node_content
 
 
-def two_node_parser(tex_str):
+def two_node_parser(tex_str, m1=None):
     """
     Nodes are as follows:   "[options], (name), at (coord), {text}" where only the [options]  and (coord) are really required
     This could be done recursively, but so far only have three levels deep with 1st, & last node patterns differnt
@@ -85,146 +238,132 @@ def two_node_parser(tex_str):
                                             node[anchor=north west] at (N1.text){$Q_1$};
     :return node_content:   Parsed tokens of form [0: '2node' or 'device', 1: '[shape]', 2: name, 3: coord1, 4: label1, 5: [id_anchor]', 6: id_name, 7: id_loc,
                                                    8: id_label]
+    :param m1:        Optional _scan_node result for the first node of tex_str when the caller already has it
     """
 
-    pattern_1st_node = r'\\node\[([^\]]+)\](?:\(([^)]*)\))?(?:(?:(?!;\s*node\[).)*?)at\s*(\([^)]*\))\s*\{((?:(?!\}\s*node\[).)*)\}(\s*node\[.*)'
-    pattern_last_node = r'node\[([^\]]+)\](?:\(([^)]*)\))?\s*at\s*(\([^)]*\))\s*\{((?:(?!\}\s*;).)*)\}\s*;'
-
     node_content = None
 
-    pattern_shape = r'\\node\s*\[\s*shape\s*='  # Check if form is \\node[shape = ...
-    if re.search(pattern_shape, tex_str):
-        node_content = ['2node']
+    if _is_shape_node(tex_str):
+        node_content = ('2node',)
     else:
-        node_content = ['device']
+        node_content = ('device',)
 
-    m1 = re.search(pattern_1st_node, tex_str, re.VERBOSE | re.DOTALL)
+    if m1 is None:
+        m1 = _scan_node(tex_str, '\\node[')
     if m1:
-        shape = m1.group(1).strip()
-        name = m1.group(2)
-        coord1 = m1.group(3).strip()
-        label1 = (m1.group(4) or '').strip()
-        node_content += [ shape, name, coord1, label1]
+        shape, name, coord1, label1, rest = m1      # name stays None when absent ("name": null in the JSON)
+        node_content += (shape.strip(), name, coord1.strip(), label1.strip())
 
-        m2 = re.search(pattern_last_node, m1.group(5), re.VERBOSE | re.DOTALL)
+        m2 = _scan_node(rest, last=True)
         if m2:
-            label_anchor = (m2.group(1) or '').strip()
-            label_label = (m2.group(2) or '').strip()
-            label_loc = (m2.group(3) or '').strip()
-            label_text = (m2.group(4) or '').strip()
-
-            node_content += ['[' + label_anchor + ']', label_label, label_loc, label_text]
+            label_anchor, label_label, label_loc, label_text, _ = m2
+            node_content += ('[' + label_anchor.strip() + ']', (label_label or '').strip(), label_loc.strip(), label_text.strip())
 
     return node_content
 
 
+@functools.lru_cache(maxsize=4096)
+def parse_node_line(line: str) -> tuple | None:
+    """
+    Tokenize one \\node command (the text from \\node[ to the end of its line) with the 1, 2 or 3 node parsers.
+    Results are cached per line text, so repeated identical node lines are parsed once.  The parsers return tuples,
+    so the cached value can be shared safely.
+    :return: Tokens as described in tokenize_all_draw_contents, or None if the line is not a supported node command
+    """
+    node_count = line.count('node[')       # Count # of 'node[' patterns
+
+    if node_count in (2, 3):
+        # The first node has the same form for both, so match it once.  No match means this is not a command
+        # the multi node parsers understand, and it is skipped like an unmatched single node below
+        m1 = _scan_node(line, '\\node[')
+        if m1:
+            if node_count == 3:
+                return three_node_parser(line, m1)
+            return two_node_parser(line, m1)      # This supports the \node[shape=...]  \node[device ...] and is not a simple draw node
+
+    elif node_count == 1:  # This is a device of a simple single node
+        m1 = _scan_node(line, '\\node[', last=True)
+        if m1:
+            node_type, name, coord1, label1, _ = m1
+            return ('node' if _is_shape_node(line) else 'device', node_type.strip(), name, coord1.strip(), label1.strip())
+
+    return None
+
+
+def parse_wire_command(options: str, cmd_content: str) -> tuple | None:
+    """
+    Tokenize the body of one \\draw or \\path command (both have the same form).  Notice, at this stage, all that
+    should be in a \\path is a wire that has at least two segments / right angles
+    :param options:      The [options] right after \\draw / \\path, or '' if there are none
+    :param cmd_content:  The rest of the command up to (not including) the ;
+    :return: ("to", ...) or ("wire", ...) tokens as described in tokenize_all_draw_contents, or None for arrows
+    """
+    if _RE_ARROW.search(options):
+        return None  # skip draws with arrows
+    if not options:
+        pre_token = (cmd_content.strip())   # No Options Listed
+    else:
+        pre_token = (cmd_content.strip()+options.strip())
+
+    tokens = _RE_WIRE_TURN.findall(pre_token)
+    # tokens = [t.strip() for t in rough_tokens if t.strip()]
+
+    # Now do the "to" or "wire"
+    # _RE_WIRE_TURN only yields to[...] tokens that start with 'to' (and they always end with ]), and CircuiTikZ
+    # Designer writes them right after the start coordinate, so test tokens[1] before scanning the whole list
+    if len(tokens) > 1 and tokens[1][:3] == 'to[':
+        tokens[1] = tokens[1][2:]       # Remove to, keep the brackets
+        return ("to", *tokens)
+    if any(t[:3] == 'to[' for t in tokens):
+        return ("to", *tokens)
+    # This is a bug, because if this is not a wire, then it will return "junk" and pass silently
+    return ("wire", *tokens)
+
+
 def tokenize_all_draw_contents(content: str):
     """
     First this extracts ALL \\draw and \\node commands from a corresponding tex string of content.
-    Second, for each "type" of circuitikz item, those are tokenized into a list
-    The first token in the list is a keyword describing what that list is "to",  "node" for a single node,
+    Second, for each "type" of circuitikz item, those are tokenized into a tuple
+    The first token in the tuple is a keyword describing what that tuple is "to",  "node" for a single node,
     "wire", "shape" for a shape object with text, and "device" for active type of devices NPN, etc.
 
-    Because the content is tokenized, then the tokens in each list are ordered data
+    Because the content is tokenized, then the tokens in each tuple are ordered data
+    :return: List of token tuples (nodes, then draws, then paths), or None if there are no commands
     """
 
-    wire_turn_pattern = r"\([^()]*\)|(?:to|node)?\[(?:[^[\]]|\[(?:[^[\]]|\[[^[\]]*\])*\])*\]|--|\-\||\|-"
-
     clean_content = remove_comments(content)
-    all_commands = []
-
-
-    # Extract \node associated with shapes of form:  \\node[xxx]() at (x, y){label1} node[xxx]() at (x1, y1){label2} ... ;
-    # Return order matches the form \node[npn](N1) at (10.75, 7.98){} node[anchor=west] at (N1.text){$Q_1$};
-    # {label} extraction supports LaTeX encoding \small $e(t)$, etc. as well as being empty
-
-
-    # Iterate through all TeX commands, and finds those with nodes
-    clean_line = clean_content.split('\n')
-    for line in clean_line:
-        node_count = len(re.findall(r'node\[', line))       # Count # of 'node[' patterns
-
-        if node_count == 3:
-            node_content = three_node_parser(line)
-            all_commands.append(node_content)
-
-        elif node_count == 2:
-            node_content = two_node_parser(line)      # This supports the \node[shape=...]  \node[device ...] and is not a simple draw node
-            all_commands.append(node_content)
-
-        elif node_count == 1:  # This is a device of a simple single node
-            pattern_one_node =  r'\\node\[([^\]]+)\](?:\(([^)]*)\))?\s*at\s*(\([^)]*\))\s*\{((?:(?!\}\s*;).)*)\}\s*;'
-            pattern_shape = r'\\node\s*\[\s*shape\s*='  # Check if form is \\node[shape = ...
-            if re.search(pattern_shape, line):
-                node_content = ['node']
-            else:
-                node_content = ['device']
-            m1 = re.search(pattern_one_node, line, re.VERBOSE | re.DOTALL)
-            if m1:
-
-                node_type = m1.group(1).strip()
-                name = m1.group(2)
-                coord1 = m1.group(3).strip()
-                label1 = (m1.group(4) or '').strip()
-
-                node_content += [node_type, name, coord1, label1]
-
-                all_commands.append(node_content)
-
-    # Iterate and parse the draw commands, but ignore ones with arrows
-    draw_pattern = r'\\draw(\[.*?\])?(.*?);'
-    for match in re.finditer(draw_pattern, clean_content, re.VERBOSE | re.DOTALL):
-        options = match.group(1) or ''
-        cmd_content = match.group(2) or ''
-        if re.search(r'\[.*?(<-|->|<->).*?\]', options):
-            continue  # skip draws with arrows
-        if not options:
-            pre_token = (cmd_content.strip())   # No Options Listed
-        else:
-            pre_token = (cmd_content.strip()+options.strip())
-
-        tokens = re.findall(wire_turn_pattern, pre_token)
-        # tokens = [t.strip() for t in rough_tokens if t.strip()]
-
-        # Now do the "to" or "wire"
-        if any(t.startswith('to') for t in tokens):
-            if tokens[1].startswith("to[") and tokens[1].endswith("]"):  # Remove to, keep the brackets
-                tokens[1] = tokens[1][2:]
-            node_content = ["to"] + tokens
-
-            all_commands.append(node_content)
-        else:  # This is a bug, because if this is not a wire, then it will return "junk"
-            node_content =  ["wire"] + tokens
-            all_commands.append(node_content)
-
-    # Now parse all \\path lines.  Notice, at this stage, all that should be there is a path, which will be coded as a wire
-    # that has at least two segments / right angles
-    path_pattern = r'\\path(\[.*?\])?(.*?);'
-    for match in re.finditer(path_pattern, clean_content, re.VERBOSE | re.DOTALL):
-        options = match.group(1) or ''
-        cmd_content = match.group(2) or ''
-        if re.search(r'\[.*?(<-|->|<->).*?\]', options):
-            continue  # skip draws with arrows
-
-        if not options:
-            pre_token = (cmd_content.strip())   # No Options Listed
-        else:
-            pre_token = (cmd_content.strip()+options.strip())
 
-        tokens = re.findall(wire_turn_pattern, pre_token)
-        # tokens = [t.strip() for t in rough_tokens if t.strip()]
-
-        # Now do the "to" or "wire"
-        if any(t.startswith('to') for t in tokens):
-            if tokens[1].startswith("to[") and tokens[1].endswith("]"):  # Remove to, keep the brackets
-                tokens[1] = tokens[1][2:]
-            node_content = ["to"] + tokens
-
-            all_commands.append(node_content)
-        else:  # This is a bug, because if this is not a wire, then it will return "junk" and pass silently
-            node_content =  ["wire"] + tokens
-            all_commands.append(node_content)
+    # One pass over the content, but the output order is unchanged: all nodes, then all draws, then all paths
+    nodes = []
+    draws = []
+    paths = []
+
+    for match in _RE_COMMAND.finditer(clean_content):
+        command = match.group(1)
+
+        if command is None:
+            # Extract \node associated with shapes of form:  \node[xxx]() at (x, y){label1} node[xxx]() at (x1, y1){label2} ... ;
+            # Return order matches the form \node[npn](N1) at (10.75, 7.98){} node[anchor=west] at (N1.text){$Q_1$};
+            # {label} extraction supports LaTeX encoding \small $e(t)$, etc. as well as being empty
+            # A node command is the rest of its line, and the scan resumes right after '\node[' so a \draw or \path
+            # sharing the line is still found
+            eol = clean_content.find('\n', match.start())
+            line = clean_content[match.start():] if eol < 0 else clean_content[match.start():eol]
+            node_content = parse_node_line(line)
+            if node_content is not None:
+                nodes.append(node_content)
+            continue
+
+        # \draw and \path commands, but ignore ones with arrows
+        node_content = parse_wire_command(match.group(2) or '', match.group(3) or '')
+        if node_content is None:
+            continue
+        if command == 'draw':
+            draws.append(node_content)
+        else:
+            paths.append(node_content)
 
+    all_commands = nodes + draws + paths
     return all_commands if all_commands else None
 
 
@@ -233,6 +372,25 @@ def remove_comments(content: str) -> str:
     Removes LaTeX comments from the content.
     A comment starts with % and continues to the end of the line.
 
-    Find the first unescaped '%' (i.e., a comment), then remove it and everything after it
+    Find the first unescaped '%' (i.e., a comment), then remove it and everything after it.  This is done with str.find
+    jumping from '%' to '%' (and then to the end of the line), so text without comments is only copied, never scanned
+    character by character.
     """
-    return re.sub(r'(?<!\\)%.*', '', content)
+    if '%' not in content:      # The common case for CircuiTikZ Designer output, nothing to copy
+        return content
+
+    out = []
+    start = 0       # Start of the text not yet copied to out
+    pos = content.find('%')
+    while pos >= 0:
+        if pos > 0 and content[pos - 1] == '\\':      # Escaped \%, not a comment
+            pos = content.find('%', pos + 1)
+            continue
+        out.append(content[start:pos])
+        start = content.find('\n', pos)     # Keep the newline itself
+        if start < 0:
+            start = len(content)
+            break
+        pos = content.find('%', start)
+    out.append(content[start:])
+    return ''.join(out)
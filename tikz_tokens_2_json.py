@@ -15,6 +15,7 @@ Functions:
  - parse_fill_options
  - parse_rotation
  - scale_dash_pattern
+   - make_dash_scaler
 
 Helper Functions for working around splitting and extracting content that may contain LaTeX math encoding
   - split_options
@@ -22,13 +23,15 @@ Helper Functions for working around splitting and extracting content that may co
    - parse_label_mixed_latex
 """
 
+import functools
 import re
+from types import MappingProxyType
 
 # ---------------------------------------------------------------------
 # TikZ Code to JSON Conversion Dictionaries
 # ---------------------------------------------------------------------
 
-ARROW_ALIASES = {
+ARROW_ALIASES = MappingProxyType({         # Read only views, these tables are never modified
     'stealth': 'stealth',
     'stealth reversed': 'stealthR',
     'latex': 'latex',
@@ -36,9 +39,9 @@ ARROW_ALIASES = {
     'to': 'to',
     'to reversed': 'toR',
     '|': 'line'
-}
+})
 
-LINE_ALIASES = {                        # For TeX to JSON.  These are all normalized to a linewidth = 1.
+LINE_ALIASES = MappingProxyType({        # For TeX to JSON.  These are all normalized to a linewidth = 1.
     'on 1pt off 4pt': 'dotted',
     'on 1pt off 2pt': 'denselydotted',
     'on 1pt off 8pt': 'looselydotted',
@@ -51,7 +54,7 @@ LINE_ALIASES = {                        # For TeX to JSON.  These are all normal
     'on 4pt off 2pt on 1pt off 2pt on 1pt off 2pt': 'dashdotdot',
     'on 4pt off 1pt on 1pt off 1pt on 1pt off 1pt': 'denselydashdotdot',
     'on 4pt off 4pt on 1pt off 4pt on 1pt off 4pt': 'looselydashdotdot'
-}
+})
 
 # LABEL_POSITION_MAP = {
 #     'above': 'north',
@@ -68,291 +71,361 @@ LATEX_TO_JSON_SCALE_X_FACTOR = 37.795286
 LATEX_TO_JSON_SCALE_Y_FACTOR = 37.795286
 LATEX_TO_JSON_SCALE_SHAPE_FACTOR = 38.88379
 
+_WIRE_DIRECTIONS = frozenset(('--', '-|', '|-'))       # Wire segment tokens
+
+# Fixed part of the "text" JSON of a shape, see parse_text_for_shape
+_TEXT_DEFAULTS = {
+    "align": "1",               # Center Horizontally
+    "justify": "0",             # Center Vertically
+    "innerSep": "0",            # Textbox separation (most likely)
+    "showPlaceholderText": "true"
+}
 
 # ---------------------------------------------------------------------
-# Functions
+# Pre-compiled regular expressions (compiled once at import, not per call)
 # ---------------------------------------------------------------------
 
+# Coordinates
+_RE_NUMERIC_COORD = re.compile(r'\(\s*(-?\d*\.?\d+)\s*,\s*(-?\d*\.?\d+)\s*\)')   # (x, y) numbers, not relative positioning
+
+# Draw / fill / shape options
+# All the shape, stroke, fill and rotation options in one scan (see _scan_options), the named group tells which one
+# matched.  dash pattern, draw= and fill= take all text between {}
+_RE_OPTION = re.compile(r'shape=(?P<shape>[^,\]]+)'
+                        r'|minimum width=(?P<min_width>[-+]?\d*\.?\d+)'
+                        r'|minimum height=(?P<min_height>[-+]?\d*\.?\d+)'
+                        r'|line width=(?P<width>[\d.]+pt)'
+                        r'|draw opacity=(?P<opacity>[^,]+)'
+                        r'|dash pattern=\{(?P<dash>[^}]*)\}'
+                        r'|draw=\{(?P<color>[^}]*)\}'
+                        r'|fill opacity=(?P<fill_opacity>[^,]+)'
+                        r'|fill=\{(?P<fill_color>[^}]*)\}'
+                        r'|xscale=(?P<xscale>-?\d*\.?\d+)'
+                        r'|yscale=(?P<yscale>-?\d*\.?\d+)'
+                        r'|rotate=(?P<rotate>-?\d*\.?\d+)')
+_RE_RGB = re.compile(r'rgb,255:red,(\d+);green,(\d+);blue,(\d+)')
+_RE_DASH_NUMBER = re.compile(r'(\d+\.?\d*)(pt)')                          # Number+unit pairs like '1pt', '4pt'
+_RE_LEADING_ZERO = re.compile(r'(?<!\d)0')                                 # A number starting with 0, e.g. '04pt'
+
+# Wire arrows
+_RE_ARROWS = re.compile(r',\s*([a-zA-Z]+)-([^],]*)')
+_RE_ONLY_ARROWS = re.compile(r'\[([^-]*)-(.*)\]')
+
+# Names, anchors and text
+_RE_COMMA_SPLIT = re.compile(r'\s*,\s*')                                # Comma separated options, whitespace dropped
+_RE_NAME = re.compile(r"name=(.+)")
+_RE_ANCHOR = re.compile(r"anchor=([^\s,\]]+)")
+_RE_LATEX = re.compile(r'\$(.*)\$', re.DOTALL)
+_RE_TEXT_COLOR = re.compile(r'\\textcolor\{([^}]+)\}(.*)')
+_RE_BRACKETS = re.compile(r'^\{(.*)\}$')                                # For removing starting and ending brackets
+_RE_OPTION_DELIMITERS = re.compile(r'[\\${},]')                            # Characters split_options has to look at
+_RE_MATH = re.compile(r'(\$(?:\\.|[^$])*\$)')
+_RE_LABEL_PREFIX = re.compile(r'l(_)?=')                                  # l= or l_=, group 1 set for l_=
+_RE_UNESCAPED_DOLLAR = re.compile(r'(?<!\\)\$')                          # A $ math delimiter, not a literal \$
 
-# The key function is next.  It is long, but breaking into the "key" types of tokens, allows for modular code
-# that really evolved from 'get something quick' to 'let's support more and more complexity.  While the lines-of-code
-# is long, one nice feature is that simple single \\nodes are independent of multi node options
 
-def convert_tokens_to_json(tokens):
-    """
-    Process the sequence of tokens for each circuit element type and create a JSON entry
-    Each circuit element collection of tokens starts with either {'to', 'node', '2node', '3node', 'device' 'wire'}
-     and the tokens for each are assumed ordered data. That is tokens[3] has a specific meaning for each type:
-    see i_o_library/tokenize_all_draw_contents for details.
+# ---------------------------------------------------------------------
+# Functions
+# ---------------------------------------------------------------------
 
-    Again: token[0] is only one of these {'to', 'node', '2node', '3node', 'device' 'wire'}
-    """
 
-    # Used by all Types
-    coord_dict = get_coordinate_list(tokens)
-    start_point = coord_dict[0]
+# The key function is convert_tokens_to_json.  Each "key" type of tokens has its own _convert_xxx function, which allows
+# for modular code that really evolved from 'get something quick' to 'let's support more and more complexity.  One nice
+# feature is that simple single \\nodes are independent of multi node options
 
-    # Process Tokens: Six Cases {'to', 'node', '2node', '3node', 'device' 'wire'}
-    if tokens[0] == 'to':
-        '''
-        Tokens form:       
-            [0: 'to', 1: (start coord), 2: [device, options], 3: (end coord)
-            
-        Example:  ['to', '(9.54, 10.75)', '[cute inductor, l_={$L_1$}]', '(9.54, 9.75)']
+def _convert_to(tokens, coord_dict):
+    '''
+    Tokens form:       
+        [0: 'to', 1: (start coord), 2: [device, options], 3: (end coord)
         
-        There should only be a start and stop coordinate for 'to'.  If not, this ignores the 3rd & higher coordinates
-        '''
+    Example:  ['to', '(9.54, 10.75)', '[cute inductor, l_={$L_1$}]', '(9.54, 9.75)']
+    
+    There should only be a start and stop coordinate for 'to'.  If not, this ignores the 3rd & higher coordinates
+    '''
 
-        end_point = coord_dict[1]
+    end_point = coord_dict[1]
 
-        result = {
-            "type": "path",
-            "points": coord_dict
-        }
+    result = {
+        "type": "path",
+        "points": coord_dict
+    }
 
-        if len(tokens[2].split('$')) > 1:  # This means there is a label
-            parts = split_options(tokens[2])
-            check = extract_label(parts[-1])
+    if '$' in tokens[2]:  # This means there is a label
+        parts = split_options(tokens[2])
+        check = extract_label(parts[-1])
 
-            label_value = {}
+        label_value = {}
 
-            if check[1] is not None:
-                label_value["value"] = check[1]
-            if check[0]:
-                label_value["otherSide"] = 'true'
-            label_value["distance"] = "0.12cm"
-            result["label"] = label_value
+        if check[1] is not None:
+            label_value["value"] = check[1]
+        if check[0]:
+            label_value["otherSide"] = 'true'
+        label_value["distance"] = "0.12cm"
+        result["label"] = label_value
 
-            result = parse_to_mirror_invert(parts, result)
+        result = parse_to_mirror_invert(frozenset(parts), result)
 
-            result["id"] = parts[0]
+        result["id"] = parts[0]
 
-            # Now check for optional name
-            m = re.match(r"name=(.+)", parts[-1])
-            if m:
-                result["name"] = m.group(1)
+        # Now check for optional name
+        m = _RE_NAME.match(parts[-1])
+        if m:
+            result["name"] = m.group(1)
 
-        elif len(tokens[2].split(',')) > 1:  # >1 means there are options, but no label (means the split works)
-            no_bracket = tokens[2].strip("[]")
-            rough_parts = no_bracket.split(',')
-            parts = [s.strip() for s in rough_parts]
-            result = parse_to_mirror_invert(parts, result)
-            result["id"] = parts[0]
-        else:  # This means no options and no labels, just the device id
-            result["id"] = tokens[2].strip("[]")
+    elif ',' in tokens[2]:  # This means there are options, but no label (means the split works)
+        no_bracket = tokens[2].strip("[]")
+        parts = _RE_COMMA_SPLIT.split(no_bracket.strip())     # Split and strip the parts in one pass
+        result = parse_to_mirror_invert(frozenset(parts), result)
+        result["id"] = parts[0]
+    else:  # This means no options and no labels, just the device id
+        result["id"] = tokens[2].strip("[]")
 
-        return result
+    return result
 
-    elif tokens[0] == 'node':
-        '''
-        Single Node
-        Token Form:   [0: 'node', 1: 'shape, options', 2: name, 3: coord1, 4: label1]
 
-        Example:  ['node', 'shape=circle, draw, line width=1pt, minimum width=-0.035cm', None, '(3.5, 8.75)', '']
-        '''
-        result = parse_shape_size(tokens[1], start_point)
+def _convert_node(tokens, coord_dict):
+    '''
+    Single Node
+    Token Form:   [0: 'node', 1: 'shape, options', 2: name, 3: coord1, 4: label1]
 
-        if tokens[2]:
-            result["name"] = tokens[2]
+    Example:  ['node', 'shape=circle, draw, line width=1pt, minimum width=-0.035cm', None, '(3.5, 8.75)', '']
+    '''
+    start_point = coord_dict[0]
 
-        stroke = parse_draw_options(tokens[1])
-        result["stroke"] = stroke  # stroke will never be blank.  At least {"opacity": 0}
+    result = parse_shape_size(tokens[1], start_point)
 
-        rotation, scale = parse_rotation(tokens[1])
-        if rotation is not None:
-            result["rotation"] = rotation
-        if scale is not None:
-            result["scale"] = scale
+    if tokens[2]:
+        result["name"] = tokens[2]
 
-        return result
-
-    elif tokens[0] == "2node":
-        """
-        Two node commands
-        Tokens form:       
-            [0: '2node', 1: '[shape]', 2: name, 3: coord1, 4: label1, 5: [id_anchor]', 6: id_name, 7: id_loc,
-             8: id_label]
-             
-        Example: ['2node',
-                 'shape=rectangle, minimum width=1.308cm, minimum height=0.59cm', 'x1', '(6.672, 13)', '',
-                 '[anchor=north, align=center, text width=0.991cm, inner sep=5pt]', '', '(6.672, 13.312)', '\\Large A $e_t$']
-        
-        Note that 2 nodes do not have the 3rd node for a label, so that operation is being ignored (maybe a bug)
-        """
+    stroke = parse_draw_options(tokens[1])
+    result["stroke"] = stroke  # stroke will never be blank.  At least {"opacity": 0}
 
-        # other_point = coord_dict[1]     # Doesn't appear to be needed
+    rotation, scale = parse_rotation(tokens[1])
+    if rotation is not None:
+        result["rotation"] = rotation
+    if scale is not None:
+        result["scale"] = scale
 
-        result = parse_shape_size(tokens[1], start_point)
+    return result
 
-        if tokens[8] is not None:
-            text = parse_text_for_shape(tokens[8])
-            result["text"] = text
 
-        if tokens[2] != '':
-            result["name"] = tokens[2]
+def _convert_2node(tokens, coord_dict):
+    """
+    Two node commands
+    Tokens form:       
+        [0: '2node', 1: '[shape]', 2: name, 3: coord1, 4: label1, 5: [id_anchor]', 6: id_name, 7: id_loc,
+         8: id_label]
+         
+    Example: ['2node',
+             'shape=rectangle, minimum width=1.308cm, minimum height=0.59cm', 'x1', '(6.672, 13)', '',
+             '[anchor=north, align=center, text width=0.991cm, inner sep=5pt]', '', '(6.672, 13.312)', '\\Large A $e_t$']
+    
+    Note that 2 nodes do not have the 3rd node for a label, so that operation is being ignored (maybe a bug)
+    """
+    start_point = coord_dict[0]
 
-        stroke = parse_draw_options(tokens[1])
-        result["stroke"] = stroke  # stroke will never be blank.  At least {"opacity": 0}
+    # other_point = coord_dict[1]     # Doesn't appear to be needed
 
-        fill = parse_fill_options(tokens[1])
-        if fill is not None:
-            result["fill"] = fill
+    result = parse_shape_size(tokens[1], start_point)
 
-        # Now rotation & Scale
-        rotation, scale = parse_rotation(tokens[1])
-        if rotation is not None:
-            result["rotation"] = rotation
-        if scale is not None:
-            result["scale"] = scale
-        # Now rotation
+    if tokens[8] is not None:
+        text = parse_text_for_shape(tokens[8])
+        result["text"] = text
 
-        return result
+    if tokens[2] != '':
+        result["name"] = tokens[2]
 
-        # End 2-Node
+    stroke = parse_draw_options(tokens[1])
+    result["stroke"] = stroke  # stroke will never be blank.  At least {"opacity": 0}
 
-    # ###############################################
-    elif tokens[0] == "3node":
-        """
-        Three nodes within one TeX command
-        Tokens Form is [0: '3node', 1: '[shape]', 2: name, 3: (coord1), 4: label1, 5: [id_anchor]', 6: id_name, 7: (id_loc),
-                        8: id_label, 9: [text options / positioning], 10: text_name, 11: (text_loc), 12: [text str]
-        
-        Example: ['3node',
-         '[shape=rectangle, line width=1pt, minimum width=1.762cm, minimum height=1.215cm]', 'my text', '(12.648, 11)', '', 
-         '[anchor=south]', '', '([yshift=0.63cm]my text.text)', '$A_{label}$',
-         '[anchor=center, align=center, text width=1.444cm, inner sep=5pt]', '', '(12.648, 11)', 
-         '\\textcolor{rgb,255:red,255;green,0;blue,128}{\\small $\\,\\boldsymbol{+}$\\  $e_c(t)$  
-         $\\frac{a}{b} $ \\ $\\ \\boldsymbol{-}$}']
-        
-        """
-
-        # text_point = coord_dict[1]    # Need to work this in
-
-        result = parse_shape_size(tokens[1], start_point)
-
-        if tokens[12] is not None:
-            text = parse_text_for_shape(tokens[12])
-            result["text"] = text
-
-        if tokens[2]:  # This is the component name or TikZ Label
-            result["name"] = tokens[2]
-
-        stroke = parse_draw_options(tokens[1])
-        result["stroke"] = stroke   # stroke will never be blank.  At least {"opacity": 0}
-
-        fill = parse_fill_options(tokens[1])
-        if fill is not None:
-            result["fill"] = fill
-
-        # Now Label
-        # Do the Label
-        if tokens[8] is not None:
-            label_array = {}
-            labels = parse_label_mixed_latex(tokens[8])
-            if labels[0].startswith('\\'):  # Pull out possible fontsize
-                m = re.search(r'^\\([a-zA-Z]+)\s*(.*)', labels[0])
-                if m:
-                    font_size = m.group(1)
-                    text["fontsize"] = font_size
-                    labels[0] = m.group(2)
-                    text2 = ' '.join(
-                        labels[1:])  # Concatenate all labels into one text block, excluding 1st fontsize
-                else:
-                    text2 = ' '.join(labels)  # Concatenate all labels into one text block, as 1st is not a fontsize
+    fill = parse_fill_options(tokens[1])
+    if fill is not None:
+        result["fill"] = fill
+
+    # Now rotation & Scale
+    rotation, scale = parse_rotation(tokens[1])
+    if rotation is not None:
+        result["rotation"] = rotation
+    if scale is not None:
+        result["scale"] = scale
+    # Now rotation
+
+    return result
+
+
+def _convert_3node(tokens, coord_dict):
+    """
+    Three nodes within one TeX command
+    Tokens Form is [0: '3node', 1: '[shape]', 2: name, 3: (coord1), 4: label1, 5: [id_anchor]', 6: id_name, 7: (id_loc),
+                    8: id_label, 9: [text options / positioning], 10: text_name, 11: (text_loc), 12: [text str]
+    
+    Example: ['3node',
+     '[shape=rectangle, line width=1pt, minimum width=1.762cm, minimum height=1.215cm]', 'my text', '(12.648, 11)', '', 
+     '[anchor=south]', '', '([yshift=0.63cm]my text.text)', '$A_{label}$',
+     '[anchor=center, align=center, text width=1.444cm, inner sep=5pt]', '', '(12.648, 11)', 
+     '\\textcolor{rgb,255:red,255;green,0;blue,128}{\\small $\\,\\boldsymbol{+}$\\  $e_c(t)$  
+     $\\frac{a}{b} $ \\ $\\ \\boldsymbol{-}$}']
+    
+    """
+    start_point = coord_dict[0]
+
+    # text_point = coord_dict[1]    # Need to work this in
+
+    result = parse_shape_size(tokens[1], start_point)
+
+    if tokens[12] is not None:
+        text = parse_text_for_shape(tokens[12])
+        result["text"] = text
+
+    if tokens[2]:  # This is the component name or TikZ Label
+        result["name"] = tokens[2]
+
+    stroke = parse_draw_options(tokens[1])
+    result["stroke"] = stroke   # stroke will never be blank.  At least {"opacity": 0}
+
+    fill = parse_fill_options(tokens[1])
+    if fill is not None:
+        result["fill"] = fill
+
+    # Now Label
+    # Do the Label
+    if tokens[8] is not None:
+        label_array = {}
+        labels = parse_label_mixed_latex(tokens[8])
+        if labels[0].startswith('\\'):  # Pull out possible fontsize
+            font = _split_font_size(labels[0])
+            if font:
+                font_size, labels[0] = font
+                text["fontsize"] = font_size
+                text2 = ' '.join(
+                    labels[1:])  # Concatenate all labels into one text block, excluding 1st fontsize
             else:
-                text2 = ' '.join(labels)  # Concatenate all labels into one text block
+                text2 = ' '.join(labels)  # Concatenate all labels into one text block, as 1st is not a fontsize
+        else:
+            text2 = ' '.join(labels)  # Concatenate all labels into one text block
+
+        label_array["value"] = text2.strip('$')
+
+        if tokens[5] is not None:
+            m = _RE_ANCHOR.search(tokens[5])
+            if m:
+                label_array["anchor"] = m.group(1)
 
-            label_array["value"] = text2.strip('$')
+        if tokens[9] is not None:
+            label_array["position"] = 'northeast'  # Hardcode these.  User will just have to move where they want
+            label_array["relativeToComponent"] = 'true'
+            label_array["distance"] = "0.16cm"
 
-            if tokens[5] is not None:
-                m = re.search(r"anchor=([^\s,\]]+)", tokens[5])
-                if m:
-                    label_array["anchor"] = m.group(1)
+        result["label"] = label_array
 
-            if tokens[9] is not None:
-                label_array["position"] = 'northeast'  # Hardcode these.  User will just have to move where they want
-                label_array["relativeToComponent"] = 'true'
-                label_array["distance"] = "0.16cm"
+    # Now rotation and scale
+    rotation, scale = parse_rotation(tokens[1])
+    if rotation is not None:
+        result["rotation"] = rotation
+    if scale is not None:
+        result["scale"] = scale
+
+    return result
+
+
+def _convert_device(tokens, coord_dict):
+    '''
+    tokens form:  [0: 'device', 1: 'device, options', 2: name, 3: (coord1), 4: label1]
+    
+    Example:    ['device', 'american and port, xscale=0.5, yscale=0.5', None, '(11.386, 13.53)', '']
+    '''
+    start_point = coord_dict[0]
 
-            result["label"] = label_array
+    result = {
+        "type": "node",
+        "position": start_point,
+    }
 
-        # Now rotation and scale
-        rotation, scale = parse_rotation(tokens[1])
+    # label_point = coord_dict[1] # Just hard coding label position, so this is ignored so do not have to parse named anchors
+    id_plus_options = tokens[1]
+    id, comma, opts_rough = id_plus_options.partition(',')
+    if not comma:
+        id = id_plus_options[:]
+        options = ''
+    else:
+        options = _RE_COMMA_SPLIT.split(opts_rough.strip())     # Split and strip the options in one pass
+
+        # Now Pull out the optional parameters like 'photo', xscale, yscale, etc.
+
+        # Check Rotation and Scale
+        rotation, scale = parse_rotation(id_plus_options)
         if rotation is not None:
             result["rotation"] = rotation
         if scale is not None:
             result["scale"] = scale
+    if len(tokens) > 5:     # Only applies to a multi node.  Simple a single node only has 5 params
+        label = {
+            "anchor": "default",
+            "position": "default",
+            "distance": "0.12cm"
+        }
+    if len(tokens) > 5:
+        m = _RE_LATEX.search(tokens[8])
+        if m:
+            label["value"] = m.group(1)
+        result["label"] = label
+    result["options"] = options
+    result["id"] = id
 
-        return result
+    # Can do anchor, as we have token[4], but setting to default for now since it is "close enough"
 
-    # End 3-Node
+    return result
 
-    elif tokens[0] == "device":
-        '''
-        tokens form:  [0: 'device', 1: 'device, options', 2: name, 3: (coord1), 4: label1]
-        
-        Example:    ['device', 'american and port, xscale=0.5, yscale=0.5', None, '(11.386, 13.53)', '']
-        '''
 
-        result = {
-            "type": "node",
-            "position": start_point,
-        }
+def _convert_wire(tokens, coord_dict):
+    """
+    Wire:  [0: 'wire', 1: (coord1), 2: direction, 3: (coord2), ..., -1: [options]]  with directions --, -| or |-
+    """
+    directions = [t for t in tokens if t in _WIRE_DIRECTIONS]
+    options = tokens[-1]
 
-        # label_point = coord_dict[1] # Just hard coding label position, so this is ignored so do not have to parse named anchors
-        id_plus_options = tokens[1]
-        parts = id_plus_options.split(',')
-        if len(parts) == 1:
-            id = id_plus_options[:]
-            options = ''
-        else:
-            id = parts[0]
-            opts_rough = parts[1:]
-            options = [s.strip() for s in opts_rough]
-
-            # Now Pull out the optional parameters like 'photo', xscale, yscale, etc.
-
-            # Check Rotation and Scale
-            rotation, scale = parse_rotation(id_plus_options)
-            if rotation is not None:
-                result["rotation"] = rotation
-            if scale is not None:
-                result["scale"] = scale
-        if len(tokens) > 5:     # Only applies to a multi node.  Simple a single node only has 5 params
-            label = {
-                "anchor": "default",
-                "position": "default",
-                "distance": "0.12cm"
-            }
-        latex_pattern = r'\$(.*)\$'
-        if len(tokens) > 5:
-            m = re.search(latex_pattern, tokens[8], flags=re.DOTALL)
-            if m:
-                label["value"] = m.group(1)
-            result["label"] = label
-        result["options"] = options
-        result["id"] = id
+    result = build_new_wire_component(coord_dict, directions, options)
 
-        # Can do anchor, as we have token[4], but setting to default for now since it is "close enough"
+    stroke = parse_draw_options(tokens[1])
+    if not set(stroke.keys()) == {"opacity"} and stroke.get("opacity") == 0:     # This is not good coding.  The parse_draw_options returns opacity=0 as the fall through.  If that changes, this breaks but not critically
+       result["stroke"] = stroke
 
-        return result
+    return result
 
-    elif tokens[0] == "wire":
-        # Do the wire as this is the only option lef
-        directions = [t for t in tokens if t in ['--', '-|', '|-']]
-        options = tokens[-1]
 
-        result = build_new_wire_component(coord_dict, directions, options)
+def _convert_unknown(tokens, coord_dict):
+    """
+    Anything else.  We should never get here as it should have failed in the Token Creation Process
+    """
+    print(f"❌ An unknown element has been encountered '{tokens}'.")
 
-        stroke = parse_draw_options(tokens[1])
-        if not set(stroke.keys()) == {"opacity"} and stroke.get("opacity") == 0:     # This is not good coding.  The parse_draw_options returns opacity=0 as the fall through.  If that changes, this breaks but not critically
-           result["stroke"] = stroke
 
-        return result
+# Converter for each token type, i.e., tokens[0]
+_CONVERTERS = {
+    'to': _convert_to,
+    'node': _convert_node,
+    '2node': _convert_2node,
+    '3node': _convert_3node,
+    'device': _convert_device,
+    'wire': _convert_wire,
+}
 
-    else:
-        # We should never get here as it should have failed in the Token Creation Process
-        print(f"❌ An unknown element has been encountered '{tokens}'.")
+
+def convert_tokens_to_json(tokens):
+    """
+    Process the sequence of tokens for each circuit element type and create a JSON entry
+    Each circuit element collection of tokens starts with either {'to', 'node', '2node', '3node', 'device' 'wire'}
+     and the tokens for each are assumed ordered data. That is tokens[3] has a specific meaning for each type:
+    see i_o_library/tokenize_all_draw_contents for details.
+
+    Again: token[0] is only one of these {'to', 'node', '2node', '3node', 'device' 'wire'}
+    """
+
+    # Used by all Types
+    coord_dict = get_coordinate_list(tokens)
+
+    # Process Tokens: Six Cases {'to', 'node', '2node', '3node', 'device' 'wire'}, one dictionary lookup
+    return _CONVERTERS.get(tokens[0], _convert_unknown)(tokens, coord_dict)
 
 
 
@@ -361,7 +434,7 @@ def parse_to_mirror_invert(parts, result):
     Parse a //draw to part (e.g. resistor) and see if it is Mirrored or Inverted as options.  If not, the result dictionary
     is returned unmodified
 
-    :param parts: Comma deliminated options for a \\to part
+    :param parts: Comma deliminated options for a \\to part, as a set (only membership is tested, a list also works)
     :param result: Current JSON dictionary
     :return: result:     Possibly updated JSON dictionary with a "scale" key
     '''
@@ -492,6 +565,25 @@ def build_shape_component(coord_dict_list, directions, line_width):
 
     return result
 
+def _add_arrows(result, start, end):
+    """
+    Add the "startArrow" / "endArrow" JSON for the TeX arrow tips start and end (either may be empty).  One
+    ARROW_ALIASES.get() per tip, and an unsupported tip is reported rather than passing silently
+    """
+    if start:
+        arrow = ARROW_ALIASES.get(start)
+        if arrow is not None:
+            result["startArrow"] = arrow
+        else:
+            print(f'⚠️ Start Arrow Key Not Supported in ARROW_ALIASES dictionary: ', start)
+    if end:
+        arrow = ARROW_ALIASES.get(end)
+        if arrow is not None:
+            result["endArrow"] = arrow
+        else:
+            print(f'⚠️ End Arrow Key Not Supported in ARROW_ALIASES dictionary: ', end)
+
+
 def build_new_wire_component(coord_dict_list, directions, options):
     """
     Build and a wire JSON object
@@ -511,73 +603,23 @@ def build_new_wire_component(coord_dict_list, directions, options):
         "directions": directions,
     }
     # Now add optional content
-    stroke = {}
     # line_width_pattern = r'line width\s*=\s*([0-9]*\.?[0-9]+pt).*?([A-Za-z]+)-to\s+([A-Za-z]+)'
-    line_width_pattern = r'line width=([\d.]+pt)'
-    only_arrows_pattern = r'\[([^-]*)-(.*)\]'
-    m = re.search(line_width_pattern, options)
-    if m:
-        stroke["width"] = m.group(1)
-        result["stroke"] = stroke
-
-        # With a Path, the 'draw' now appears in the options.  Keeping the code the same as the process tokens so a function can be used
-        m_path = re.search(r'draw', options)  # Must support standalone draw with no RGB Color options
-        if m_path:
-            width_for_style = 1
-            stroke = {}
-            #  This should be done as a loop iterating over the patterns
-            m2 = re.search(r'line width=([\d.]+pt)', options)
-            if m2:
-                stroke["width"] = m2.group(1)
-                width_for_style = float(m2.group(1).replace('pt', ''))
-
-            m2 = re.search(r'draw opacity=([^,]+)', options)
-            if m2:
-                stroke["opacity"] = m2.group(1)
-
-            m2 = re.search(r'dash pattern=\{([^}]*)\}', options)  # All text between {}
-            if m2:  # The mapping between TeX and JSON is hardcoded
-                key = scale_dash_pattern(m2.group(1), width_for_style)
-                if key in LINE_ALIASES.keys():
-                    stroke["style"] = LINE_ALIASES[key]
-                else:
-                    print(f'⚠️ The pattern', key, 'was not converted. Defaulting to a solid line')
-            # Color
-            m3 = re.search(r'draw=\{([^}]*)\}', options)  # Now see if rgb options, & pull off {}
-            if m3:
-                m4 = re.search(r'rgb,255:red,(\d+);green,(\d+);blue,(\d+)', m3.group(1))
-                if m4:
-                    red, green, blue = m4.groups()
-                    stroke["color"] = f'rgb({red},{green},{blue})'
-            result["stroke"] = stroke
-
-
-        m_arrow = re.search(r',\s*([a-zA-Z]+)-([^],]*)', options)
+    line_width = _scan_options(options).get('width')
+    if line_width is not None:
+        # With a Path, the 'draw' now appears in the options.  Same stroke parsing as parse_draw_options
+        if 'draw' in options:  # Must support standalone draw with no RGB Color options
+            result["stroke"] = _stroke_dict(options)
+        else:
+            result["stroke"] = {"width": line_width}
+
+        m_arrow = _RE_ARROWS.search(options)
         if m_arrow:
-            if m_arrow.group(1):
-                if m_arrow.group(1) in ARROW_ALIASES:       # Not letting an error pass silently
-                    result["startArrow"] = ARROW_ALIASES[m_arrow.group(1)]
-                else:
-                    print(f'⚠️ Start Arrow Key Not Supported in ARROW_ALIASES dictionary: ', m_arrow.group(1))
-            if m_arrow.group(2):
-                if m_arrow.group(2) in ARROW_ALIASES:
-                    result["endArrow"] = ARROW_ALIASES[m_arrow.group(2)]
-                else:
-                    print(f'⚠️ End Arrow Key Not Supported in ARROW_ALIASES dictionary: ', m_arrow.group(2))
+            _add_arrows(result, m_arrow.group(1), m_arrow.group(2))
 
     else:       # No Linewidth, but still check arrows
-        m = re.search(only_arrows_pattern, options)
+        m = _RE_ONLY_ARROWS.search(options)
         if m:
-            if m.group(1):
-                if m.group(1) in ARROW_ALIASES:
-                    result["startArrow"] = ARROW_ALIASES[m.group(1)]
-                else:
-                    print(f'⚠️ Start Arrow Key Not Supported in ARROW_ALIASES dictionary: ', m.group(1))
-            if m.group(2):
-                if m.group(2) in ARROW_ALIASES:
-                    result["endArrow"] = ARROW_ALIASES[m.group(2)]
-                else:
-                    print(f'⚠️ End Arrow Key Not Supported in ARROW_ALIASES dictionary: ', m.group(2))
+            _add_arrows(result, m.group(1), m.group(2))
 
 
     return result
@@ -591,68 +633,123 @@ def get_coordinate_list(tokens):
     Bug:  Need to handle the case of relative positioning.  For Example, a TikZ label of X1 having position
     ([yshift=0.04cm]X1.north east) is simply ignored
     """
-    coordinates = [t for t in tokens if t is not None and re.match(r'^\(.*\)$', t)]   # Must start with ( and end with ) & ignore None types
-    points = []
-    for current_coord in coordinates:
-        if re.match(r'\(\s*-?\d*\.?\d+\s*,\s*-?\d*\.?\d+\s*\)', current_coord) is not None:  # Ignore relative positioning
-            x_str, y_str = current_coord.strip("()").split(",")
-            x_conv = convert_coordinate(float(x_str), "x")
-            y_conv = convert_coordinate(float(y_str), "y")
-            points.append([x_conv, y_conv])
-
+    # Batch form of convert_coordinate + clean_coordinates: the scale factors are read once, and the values are only
+    # rounded once (rounding an already rounded value to 3 decimals does not change it).  'or 0.0' turns -0.0 into 0.0
+    scale_x = LATEX_TO_JSON_SCALE_X_FACTOR
+    scale_y = -LATEX_TO_JSON_SCALE_Y_FACTOR      # Invert Y axis
+    round_ = round                               # Local name, not a builtins lookup per value
     coord_dict_list = []
-    for pair in points:
-        x, y = pair
-        coord_dict_list.append(clean_coordinates({"x": x, "y": y}))
+    append = coord_dict_list.append
+    for t in tokens:        # One pass: filter and convert each token
+        if t is None or t[:1] != '(' or t[-1:] != ')':     # Must start with ( and end with ) & ignore None types
+            continue
+        m = _RE_NUMERIC_COORD.match(t)      # The match captures x and y, no strip / split needed
+        if m is not None:  # Ignore relative positioning
+            x_str, y_str = m.groups()
+            append({"x": round_(float(x_str) * scale_x, 3) or 0.0,
+                    "y": round_(float(y_str) * scale_y, 3) or 0.0})
 
     return coord_dict_list
 
 
-def parse_shape_size(token, location):
+@functools.lru_cache(maxsize=1024)
+def _scan_options(options):
     '''
-    This parses the token to determine what shape is desired, what size it is.  This needs the location passed in
-    :param token:
-    :param start_location:
-    :return: result:  JSON entry
+    Scan an option string once for all the _RE_OPTION options.  As with separate searches per option, the first
+    occurrence of each one is used.  The shape, draw, fill and rotation parsers all read the same option token, so the
+    scan is cached per string.
+    :param options:   Option string, e.g. 'shape=rectangle, draw, line width=1pt, minimum width=1.3cm'
+    :return: Dictionary of group name (e.g. 'width', 'fill_color') --> matched text.  Shared by the cache, do not modify
     '''
-    # re patterns for matching strings
-    shape_pattern = r'shape=([^,\]]+)'
-    min_width_pattern =  r'minimum width=([-+]?\d*\.?\d+)'
-    min_height_pattern = r'minimum height=([-+]?\d*\.?\d+)'
+    found = {}
+    for m in _RE_OPTION.finditer(options):
+        found.setdefault(m.lastgroup, m.group(m.lastgroup))
+    return found
+
+
+@functools.lru_cache(maxsize=1024)
+def _shape_dims(token):
+    '''
+    The location independent part of parse_shape_size, cached per option token since repeated placements of the same
+    shape share it.
+    :return: (JSON shape type or None, (x, y) size or None)
+    '''
+    found = _scan_options(token)
 
     # Shape  (Need error checking in case shape type is new/different)
-    m = re.search(shape_pattern, token)
-    if m:
-        shape_type = m.group(1).strip()
+    shape = None
+    if 'shape' in found:
+        shape_type = found['shape'].strip()
         if shape_type == 'rectangle':
             shape = 'rect'
         else:  # This may be a bug, but the only two options are circle or ellipse and both -> ellipse
             shape = 'ellipse'
 
+    # Width and Height (Both need to be detected to produce JSON entry)
+    size = None
+    if 'min_width' in found:
+        width = round(float(found['min_width']) * LATEX_TO_JSON_SCALE_SHAPE_FACTOR, 3)
+        width = max(0, width)       # Only allow positive #'s if negative then set to zero
+        if 'min_height' in found:
+            height = round(float(found['min_height']) * LATEX_TO_JSON_SCALE_SHAPE_FACTOR, 3)
+            size = (width, height)
+        else:
+            size = (width, width)
+    return shape, size
+
+
+def parse_shape_size(token, location):
+    '''
+    This parses the token to determine what shape is desired, what size it is.  This needs the location passed in
+    :param token:
+    :param start_location:
+    :return: result:  JSON entry
+    '''
+    shape, size = _shape_dims(token)
+
     result = {
         "type": shape,
         "position": location
     }
-
-    # Width and Height (Both need to be detected to produce JSON entry)
-    m = re.search(min_width_pattern, token)
-    if m:
-        width = round(float(m.group(1)) * LATEX_TO_JSON_SCALE_SHAPE_FACTOR, 3)
-        width = max(0, width)       # Only allow positive #'s if negative then set to zero
-        m = re.search(min_height_pattern, token)
-        if m:
-            height = round(float(m.group(1)) * LATEX_TO_JSON_SCALE_SHAPE_FACTOR, 3)
-            result["size"] = {
-                "x": width,
-                "y": height
-            }
-        else:
-            result["size"] = {
-                "x": width,
-                "y": width
-            }
+    if size is not None:
+        result["size"] = {
+            "x": size[0],
+            "y": size[1]
+        }
     return result
 
+def _split_font_size(label):
+    '''
+    Split a leading font size macro off a label, e.g. '\\small A ' --> ('small', 'A ').  Same result as the regex
+    ^\\([a-zA-Z]+)\\s*(.*) , but a plain scan is cheaper for these short strings
+    :param label:   Label text starting with \\
+    :return: (macro name, rest of the label) or None if there is no letter after the \\
+    '''
+    end = 1
+    n = len(label)
+    while end < n and label[end].isascii() and label[end].isalpha():
+        end += 1
+    if end == 1:
+        return None
+    rest = label[end:].lstrip()
+    return label[1:end], rest.partition('\n')[0]      # Like the regex . the rest stops at a newline
+
+
+@functools.lru_cache(maxsize=256)
+def _extract_rgb(text):
+    '''
+    Convert a TeX color of the form rgb,255:red,255;green,0;blue,128 (as used by draw=, fill= and \\textcolor) to JSON.
+    Diagrams use a small palette, so the result is cached per color text.
+    :param text:    Color option text, e.g. the part between {} of draw={...}
+    :return: 'rgb(255,0,128)' or None if there is no rgb,255 color.  Standard colors like 'red' are not supported
+    '''
+    m = _RE_RGB.search(text)
+    if m is None:
+        return None
+    red, green, blue = m.groups()
+    return f'rgb({red},{green},{blue})'
+
+
 def parse_text_for_shape(token):
     '''
     A shape may have a text item associate with it, this parses it, managing fontsize and text with LaTeX math support
@@ -661,23 +758,14 @@ def parse_text_for_shape(token):
     '''
 
     # Need routine to parse text configuration.  Hard code part of the "text" key for now, as conversion is convoluted
-    text = {
-        "align": "1",               # Center Horizontally
-        "justify": "0",             # Center Vertically
-        "innerSep": "0",            # Textbox separation (most likely)
-        "showPlaceholderText": "true"
-    }
-
-    pattern_color = r'\\textcolor\{([^}]+)\}(.*)'
+    text = _TEXT_DEFAULTS.copy()        # A copy, the caller may add keys (e.g. "fontsize" for 3 node labels)
 
-    m = re.search(pattern_color, token)
+    m = _RE_TEXT_COLOR.search(token)
     if m:               # \\textcolor detected
-        m_color = re.search(r'rgb,255:red,(\d+);green,(\d+);blue,(\d+)', m.group(1))
-        if m_color:
-            red, green, blue = m_color.groups()
-            text["color"] = f'rgb({red},{green},{blue})'
-        pattern_bracket = r'^\{(.*)\}$'         #For removing starting and ending brackets
-        m_no_brackets = re.match(pattern_bracket, m.group(2))
+        color = _extract_rgb(m.group(1))
+        if color is not None:
+            text["color"] = color
+        m_no_brackets = _RE_BRACKETS.match(m.group(2))
         if m_no_brackets:
             token = m_no_brackets.group(1)
         else:
@@ -687,11 +775,10 @@ def parse_text_for_shape(token):
     if token is not None:
         labels = parse_label_mixed_latex(token)
         if labels[0].startswith('\\'):  # Pull out possible fontsize
-            m = re.search(r'^\\([a-zA-Z]+)\s*(.*)', labels[0])
-            if m:
-                font_size = m.group(1)
+            font = _split_font_size(labels[0])
+            if font:
+                font_size, labels[0] = font
                 text["fontSize"] = font_size
-                labels[0] = m.group(2)
                 text2 = ' '.join(labels)  # Concatenate all labels noting fontsize has been removed
             else:
                 text2 = ' '.join(labels)  # Concatenate all labels into one text block, as 1st is not a fontsize
@@ -700,6 +787,65 @@ def parse_text_for_shape(token):
         text["text"] = text2
     return text
 
+def _parse_stroke(options):
+    '''
+    Build the stroke for draw options (shared by shapes and wires): line width, draw opacity, dash pattern (see
+    LINE_ALIASES for supported patterns) and the draw={rgb,255:...} color.
+
+    :param options:   Draw Option Tokens
+    :return: stroke, unconverted      JSON stroke dictionary, empty if none of the options are present, and the dash
+                                      pattern key that has no LINE_ALIASES entry (else None)
+    '''
+    found = _scan_options(options)
+
+    stroke = {}
+    unconverted = None
+    width_for_style = 1
+    if 'width' in found:
+        stroke["width"] = found['width']
+        width_for_style = float(found['width'].replace('pt', ''))
+
+    if 'opacity' in found:
+        stroke["opacity"] = found['opacity']
+
+    if 'dash' in found:  # The mapping between TeX and JSON is hardcoded
+        key = scale_dash_pattern(found['dash'], width_for_style)
+        style = LINE_ALIASES.get(key)
+        if style is not None:
+            stroke["style"] = style
+        else:
+            unconverted = key       # Warned about by _stroke_dict, outside the cache
+
+    # Color.  Need a function to support additional color options vs just RGB
+    if 'color' in found:  # Now see if rgb options
+        color = _extract_rgb(found['color'])
+        if color is not None:
+            stroke["color"] = color
+
+    return stroke, unconverted
+
+
+@functools.lru_cache(maxsize=1024)
+def _stroke_items(options):
+    '''
+    _parse_stroke(options) cached per option string, with the stroke as a tuple of (key, value) items so the cached
+    value cannot be modified.  Callers use _stroke_dict.
+    '''
+    stroke, unconverted = _parse_stroke(options)
+    return tuple(stroke.items()), unconverted
+
+
+def _stroke_dict(options):
+    '''
+    The stroke dictionary for draw options.  The warning for an unsupported dash pattern is printed here, not in the
+    cached _stroke_items, so it appears every time the pattern is used and not only the first time it is parsed.
+    '''
+    items, unconverted = _stroke_items(options)
+    if unconverted is not None:
+        print(f'⚠️ The pattern', unconverted, 'was not converted. Defaulting to a solid line')
+    return dict(items)
+
+
 def parse_draw_options(token):
     '''
     This searches over the options for a TikZ draw object and detects the following parameters
@@ -712,64 +858,41 @@ def parse_draw_options(token):
                                       That is coupled to other parts of the code (poorly) and should be refactored
     '''
 
-    m = re.search(r'draw', token)  # Must support standalone draw with no RGB Color options
-    stroke = {}
-    if m:
-        width_for_style = 1
-        #  This should be done as a loop iterating over the patterns
-        m2 = re.search(r'line width=([\d.]+pt)', token)
-        if m2:
-            stroke["width"] = m2.group(1)
-            width_for_style = float(m2.group(1).replace('pt', ''))
-
-        m2 = re.search(r'draw opacity=([^,]+)', token)
-        if m2:
-            stroke["opacity"] = m2.group(1)
-
-        m2 = re.search(r'dash pattern=\{([^}]*)\}', token)  # All text between {}
-        if m2:  # The mapping between TeX and JSON is hardcoded
-            key = scale_dash_pattern(m2.group(1), width_for_style)
-            if key in LINE_ALIASES.keys():
-                stroke["style"] = LINE_ALIASES[key]
-            else:
-                print(f'⚠️ The pattern', key, 'was not converted. Defaulting to a solid line')
+    if 'draw' not in token:  # No Draw parameters, so return a blank stroke (a plain substring test, no regex)
+        return {"opacity": 0}   # Do NOT change this, it will ripple through the code.  Probably should return 2 params stroke, False if this else or stroke, True for everything else
 
-        # Color.  Need a function to support additional color options vs just RGB
-        m3 = re.search(r'draw=\{([^}]*)\}', token)  # Now see if rgb options, & pull off {}
-        if m3:
-            m4 = re.search(r'rgb,255:red,(\d+);green,(\d+);blue,(\d+)', m3.group(1))
-            if m4:
-                red, green, blue = m4.groups()
-                stroke["color"] = f'rgb({red},{green},{blue})'
+    return _stroke_dict(token)  # Must support standalone draw with no RGB Color options
 
-    else:  # No Draw parameters, so return a blank stroke
-        stroke["opacity"] = 0   # Do NOT change this, it will ripple through the code.  Probably should return 2 params stroke, False if this else or stroke, True for everything else
 
-    return stroke
+@functools.lru_cache(maxsize=1024)
+def _fill_items(token):
+    '''
+    The fill opacity and RGB color of an option token that has 'fill', cached per token as a tuple of (key, value)
+    items so the cached value cannot be modified.
+    '''
+    fill = {}  # Must support standalone fill with no RGB Color options
+    found = _scan_options(token)
+    if 'fill_opacity' in found:
+        fill["opacity"] = found['fill_opacity']
+    if 'fill_color' in found:  # Now see if rgb options
+        color = _extract_rgb(found['fill_color'])
+        if color is not None:
+            fill["color"] = color
+    return tuple(fill.items())
 
 
 def parse_fill_options(token):
     '''
     Within the first option token, it is possible to have fill style and colors
     :param token:
-    :return: fill JSON opacity and RGB color.  Standard colors like 'red' or 'blue' are not supported
-    '''
-
-    #
-    fill = None
-    m = re.search(r'fill', token)  # Must support standalone fill with no RGB Color options
-    fill = {}
-    if m:
-        m2 = re.search(r'fill opacity=([^,]+)', token)
-        if m2:
-            fill["opacity"] = m2.group(1)
-        m3 = re.search(r'fill=\{([^}]*)\}', token)  # Now see if rgb options, & pull off {}
-        if m3:
-            m4 = re.search(r'rgb,255:red,(\d+);green,(\d+);blue,(\d+)', m3.group(1))
-            if m4:
-                red, green, blue = m4.groups()
-                fill["color"] = f'rgb({red},{green},{blue})'
-    return fill
+    :return: fill JSON opacity and RGB color, or None if there is no fill.  Standard colors like 'red' or 'blue' are
+             not supported
+    '''
+
+    if 'fill' not in token:
+        return None
+
+    return dict(_fill_items(token))
 
 
 def parse_rotation(token):
@@ -786,47 +909,62 @@ def parse_rotation(token):
     :return: rotation, scale         rotation is a string for angle.
                                     scale is a dictionary of form: {"x": 1, "y": -1}
     '''
-    # re patterns for matching strings
-    xscale_pattern = r'xscale=(-?\d*\.?\d+)'
-    yscale_pattern = r'yscale=(-?\d*\.?\d+)'
-    rotate_pattern = r'rotate=(-?\d*\.?\d+)'
+    if 'scale' not in token and 'rotate' not in token:      # Most tokens have neither, skip the regex scan
+        return None, None
 
+    rotation, scale_items = _rotation_items(token)
+    if scale_items is None:
+        return rotation, None
+    return rotation, dict(scale_items)
+
+
+@functools.lru_cache(maxsize=1024)
+def _rotation_items(token):
+    '''
+    The rotation and scale of parse_rotation, cached per option token.  The scale is a tuple of (key, value) items so
+    the cached value cannot be modified.
+    :return: rotation, scale items or None
+    '''
     rotation = None
     scale = None
-    m_x = re.search(xscale_pattern, token)
-    m_y = re.search(yscale_pattern, token)
-    m_rot = re.search(rotate_pattern, token)
+    found = _scan_options(token)        # Shared scan with the shape / draw / fill options
+    xscale = found.get('xscale')
+    yscale = found.get('yscale')
+    rotate = found.get('rotate')
 
-    if m_x and m_y and m_rot:                   # This case:  x=-1, y=-1, rotation=-180  -->  "x"=-1, "y"-1  "rotation"=-180
+    if xscale and yscale and rotate:                   # This case:  x=-1, y=-1, rotation=-180  -->  "x"=-1, "y"-1  "rotation"=-180
         scale = {
-            "x": m_x.group(1),
-            "y": m_y.group(1)
+            "x": xscale,
+            "y": yscale
         }
-        rotation = m_rot.group(1)
+        rotation = rotate
 
-    elif m_x and not m_y and not m_rot:           # This case: x=-1  -->  "x"=1, "y"-1  Rotation=-180
+    elif xscale and not yscale and not rotate:           # This case: x=-1  -->  "x"=1, "y"-1  Rotation=-180
+        flipped = -float(xscale)      # Converted once, used for both
         scale = {
-            "x": -float(m_x.group(1)),
-            "y": -float(m_x.group(1))
+            "x": flipped,
+            "y": flipped
         }
         rotation = '-180'
 
-    elif not m_x and m_y and not m_rot:            # This case: y=-1  --> "x"=1, "y"-1  No Rotation
+    elif not xscale and yscale and not rotate:            # This case: y=-1  --> "x"=1, "y"-1  No Rotation
         scale = {
-            "x": -float(m_y.group(1)),
-            "y": m_y.group(1)
+            "x": -float(yscale),
+            "y": yscale
         }
 
-    elif m_rot:
-        rotation = m_rot.group(1)
+    elif rotate:
+        rotation = rotate
 
-    elif m_x and m_y and not m_rot:                   # This case:  x = float, y = float  no rotation
+    elif xscale and yscale and not rotate:                   # This case:  x = float, y = float  no rotation
         scale = {
-            "x": m_x.group(1),
-            "y": m_y.group(1)
+            "x": xscale,
+            "y": yscale
         }
 
-    return rotation, scale
+    if scale is None:
+        return rotation, None
+    return rotation, tuple(scale.items())
 
 
 def split_options(s):
@@ -843,48 +981,63 @@ def split_options(s):
     if s.startswith('[') and s.endswith(']'):
         s = s[1:-1]
 
+    # Only \ $ { } and , change the state, so jump from one of those to the next and slice the parts out of s
     parts = []
-    current = []
+    start = 0           # Start of the current part
+    skip = 0            # A \ escapes the next character, so matches before skip are ignored
     depth_brace = 0
     in_dollar = False
-    escape = False
 
-    for char in s:
-        if escape:
-            current.append(char)
-            escape = False
+    for m in _RE_OPTION_DELIMITERS.finditer(s):
+        i = m.start()
+        if i < skip:
             continue
+        char = m.group()
 
         if char == '\\':
-            current.append(char)
-            escape = True
-            continue
-
-        if char == '$':
+            skip = i + 2
+        elif char == '$':
             in_dollar = not in_dollar
-            current.append(char)
+        elif in_dollar:
             continue
-
-        if not in_dollar:
-            if char == '{':
-                depth_brace += 1
-            elif char == '}':
-                depth_brace -= 1
-
-        # Split only on commas at top level
-        if char == ',' and depth_brace == 0 and not in_dollar:
-            parts.append(''.join(current).strip())
-            current = []
-        else:
-            current.append(char)
+        elif char == '{':
+            depth_brace += 1
+        elif char == '}':
+            depth_brace -= 1
+        elif depth_brace == 0:      # Split only on commas at top level
+            parts.append(s[start:i].strip())
+            start = i + 1
 
     # add last part
-    if current:
-        parts.append(''.join(current).strip())
+    if start < len(s):
+        parts.append(s[start:].strip())
 
     return parts
 
 
+def _scale_match(scale_factor, match):
+    '''
+    _RE_DASH_NUMBER.sub callback for scale_dash_pattern: one number+unit pair divided by scale_factor.  Keep the
+    division, multiplying by 1 / scale_factor rounds differently and int() then truncates e.g. 3.9 / 1.3 to 2 not 3
+    '''
+    number = float(match.group(1))
+    unit = match.group(2)
+    scaled_number = number / scale_factor
+    # Format as integer since all original values are integers
+    return f"{int(scaled_number)}{unit}"
+
+
+@functools.lru_cache(maxsize=64)
+def make_dash_scaler(scale_factor):
+    '''
+    Build the number+unit substitution for one line width, so callers scaling many dash patterns at the same width do
+    the setup once.  Cached, since diagrams only use a few line widths.  The division is kept (see _scale_match)
+    :param scale_factor:  Line width to remove normalization, as for scale_dash_pattern
+    :return: Function taking a dash pattern and returning its key, e.g. scaler('on 2.8pt off 0.7pt') --> 'on 4pt off 1pt'
+    '''
+    return functools.partial(_RE_DASH_NUMBER.sub, functools.partial(_scale_match, scale_factor))
+
+
 def scale_dash_pattern(dash_pattern, scale_factor):
     '''
     This takes any token option with a Line Width Pattern, removes the line width scaling, so the key matches the
@@ -896,18 +1049,12 @@ def scale_dash_pattern(dash_pattern, scale_factor):
     :return: Key value string  E.g., 'on 4pt off 1pt on 1pt off 1pt'   for this case as a possible Key in the LINE_ALIAS dictionary
     '''
 
-    # Pattern to find number+unit pairs like '1pt', '4pt'
-    pattern = r'(\d+\.?\d*)(pt)'
-
-    def scale_match(match):
-        number = float(match.group(1))
-        unit = match.group(2)
-        scaled_number = number / scale_factor
-        # Format as integer since all original values are integers
-        return f"{int(scaled_number)}{unit}"
+    # Default line width and whole numbers without leading zeros (int() would turn '04pt' into '4pt'): nothing to rescale
+    if scale_factor == 1 and '.' not in dash_pattern and _RE_LEADING_ZERO.search(dash_pattern) is None:
+        return dash_pattern
 
     # Replace all number+unit pairs with scaled versions
-    scaled_pattern = re.sub(pattern, scale_match, dash_pattern)
+    scaled_pattern = make_dash_scaler(scale_factor)(dash_pattern)
 
     return scaled_pattern
 
@@ -920,35 +1067,34 @@ def parse_label_mixed_latex(text):
     :param text: '\\small $\\,\\boldsymbol{+}$  $e_c(t)$  $\\frac{a}{b} $  $\\ \\boldsymbol{-}$'
     :return: ['\\small ', '$\\,\\boldsymbol{+}$  $e_c(t)$  $\\frac{a}{b} $  $\\ \\boldsymbol{-}$']
     '''
-    math_pattern = r'(\$(?:\\.|[^$])*\$)'
-    parts = [p for p in re.split(math_pattern, text) if p]
-
-    parts_new_line = ['\n' if item.strip() == '\\\\' else item for item in parts]
+    if '$' not in text:                 # No math, split() would only hand back the text itself
+        if not text:
+            return []
+        return ['\n' if text.strip() == '\\\\' else text]
 
-    return parts_new_line
+    # One pass: drop the empty pieces split() leaves around the math and swap \\ for newlines
+    return ['\n' if p.strip() == '\\\\' else p for p in _RE_MATH.split(text) if p]
 
 
+@functools.lru_cache(maxsize=1024)
 def extract_label(option):
     """
     Extract label text from l={...} or l_={...}, handling:
-    - nested braces outside math mode
-    - ignoring braces inside $...$
+    - nested braces, kept in the label text as is
     - removing outermost $...$ if present
     Returns (is_l_underscore, label_text)
     It does not handle l^, l2_, etc. type of options
     """
 
-    # Detect prefix
-    if option.startswith("l_="):
-        is_l_ = True
-        s = option[3:]
-    elif option.startswith("l="):
-        is_l_ = False
-        s = option[2:]
-    else:
+    # Detect prefix.  Most options do not start with l, so check the first character before the regex
+    if option[:1] != 'l':
+        return None, None
+    m = _RE_LABEL_PREFIX.match(option)
+    if m is None:
         return None, None
+    is_l_ = m.group(1) is not None
 
-    s = s.strip()
+    s = option[m.end():].strip()
 
     # Must be {...}
     if not (s.startswith("{") and s.endswith("}")):
@@ -956,37 +1102,8 @@ def extract_label(option):
 
     body = s[1:-1]
 
-    # --- Parse for nested braces and math mode ---
-    result = []
-    depth = 0
-    in_math = False
-    escape = False
-
-    for ch in body:
-        if escape:
-            result.append(ch)
-            escape = False
-            continue
-
-        if ch == "\\":
-            result.append(ch)
-            escape = True
-            continue
-
-        if ch == "$":
-            in_math = not in_math
-            result.append(ch)
-            continue
-
-        if not in_math:
-            if ch == "{":
-                depth += 1
-            elif ch == "}":
-                depth -= 1
-
-        result.append(ch)
-
-    out = "".join(result).strip()
+    # Everything between the outer { } is the label, braces inside (nested or in $...$) are kept as they are
+    out = body.strip()
 
     # --- Remove OUTER math delimiters ONLY ---
     # Only remove ONE leading and ONE trailing $
@@ -994,7 +1111,7 @@ def extract_label(option):
         # Make sure they are matching outermost delimiters,
         # not something like "$a$ + $b$"
         inner = out[1:-1]
-        if inner.count("$") % 2 == 0:   # balanced internal $ pairs
+        if len(_RE_UNESCAPED_DOLLAR.findall(inner)) % 2 == 0:   # balanced internal $ pairs, a literal \$ is not one
             out = inner  # strip the pair
 
     return is_l_, out
\ No newline at end of file